@@ -85,7 +85,12 @@ def command_line(args: Any = None) -> None:
                 print(json.dumps(state, indent=2, sort_keys=True))
             await flow_controller.close()
 
-    asyncio.run(get())
+    try:
+        import uvloop  # type: ignore[import-not-found]
+    except ImportError:
+        asyncio.run(get())
+    else:
+        uvloop.run(get())
 
 
 if __name__ == '__main__':
@@ -6,9 +6,13 @@ Copyright (C) 2023 NuMat Technologies
 from __future__ import annotations
 
 import asyncio
-from typing import Any, ClassVar
+import warnings
+from typing import Any, ClassVar, Iterable
 
-from .util import Client, SerialClient, TcpClient, _is_float
+from .util import Client, SerialClient, TcpClient, _try_float
+
+# Over range flags for mass, volume, pressure, and temperature
+_OVER_RANGE_FLAGS = frozenset(('MOV', 'VOV', 'POV', 'TOV'))
 
 
 class FlowMeter:
@@ -21,14 +25,26 @@ class FlowMeter:
     connection using pyserial, or an Ethernet <-> serial converter.
     """
 
-    # A dictionary that maps port names to a tuple of connection
-    # objects and the refcounts
-    open_ports: ClassVar[dict[int, tuple]] = {}
-    gases: ClassVar[list] = ['Air', 'Ar', 'CH4', 'CO', 'CO2', 'C2H6', 'H2', 'He',
-                             'N2', 'N2O', 'Ne', 'O2', 'C3H8', 'n-C4H10', 'C2H2',
-                             'C2H4', 'i-C2H10', 'Kr', 'Xe', 'SF6', 'C-25', 'C-10',
-                             'C-8', 'C-2', 'C-75', 'A-75', 'A-25', 'A1025', 'Star29',
-                             'P-5']
+    __slots__ = ('_firmware_lock', '_pool_key', 'button_lock', 'firmware', 'hw', 'keys',
+                 'open', 'unit')
+
+    # A dictionary that maps port names and the event loop using them to
+    # a tuple of connection objects and the refcounts
+    open_ports: ClassVar[dict[tuple[str, asyncio.AbstractEventLoop], tuple[Client, int]]] = {}
+    gases: ClassVar[tuple[str, ...]] = ('Air', 'Ar', 'CH4', 'CO', 'CO2', 'C2H6', 'H2', 'He',
+                                        'N2', 'N2O', 'Ne', 'O2', 'C3H8', 'n-C4H10', 'C2H2',
+                                        'C2H4', 'i-C2H10', 'Kr', 'Xe', 'SF6', 'C-25', 'C-10',
+                                        'C-8', 'C-2', 'C-75', 'A-75', 'A-25', 'A1025', 'Star29',
+                                        'P-5')
+    _gas_index: ClassVar[dict[str, int]] = {g: i for i, g in enumerate(gases)}
+    # Data frame fields, keyed by the number of values the device reports
+    _keys_by_length: ClassVar[dict[int, tuple[str, ...]]] = {
+        2: ('pressure', 'setpoint'),
+        5: ('pressure', 'temperature', 'volumetric_flow', 'mass_flow', 'gas'),
+        6: ('pressure', 'temperature', 'volumetric_flow', 'mass_flow', 'setpoint', 'gas'),
+        7: ('pressure', 'temperature', 'volumetric_flow', 'mass_flow', 'setpoint',
+            'total flow', 'gas'),
+    }
 
     def __init__(self, address: str = '/dev/ttyUSB0', unit: str = 'A', **kwargs: Any) -> None:
         """Connect this driver with the appropriate USB / serial port.
@@ -36,17 +52,44 @@ class FlowMeter:
         Args:
             address: The serial port or TCP address:port. Default '/dev/ttyUSB0'.
             unit: The Alicat-specified unit ID, A-Z. Default 'A'.
+
+        Devices created on the same port and event loop share one
+        connection. Connection kwargs only take effect for the first of
+        them; later ones warn that theirs are ignored.
         """
-        if address.startswith('/dev') or address.startswith('COM'):  # serial
-            self.hw: Client = SerialClient(address=address, **kwargs)
+        try:
+            loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:  # no running loop, so nothing to share a connection with
+            loop = None
+        # Connections are bound to their event loop, so forget those of finished loops
+        for key in [key for key in self.open_ports if key[1].is_closed()]:
+            del self.open_ports[key]
+
+        pooled = self.open_ports.get((address, loop)) if loop is not None else None
+        if pooled is None:
+            if address.startswith('/dev') or address.startswith('COM'):  # serial
+                hw: Client = SerialClient(address=address, **kwargs)
+            else:
+                hw = TcpClient(address=address, **kwargs)
+            refcount = 0
         else:
-            self.hw = TcpClient(address=address, **kwargs)
+            hw, refcount = pooled
+            if kwargs:
+                warnings.warn(f"{address} is already open; ignoring {', '.join(kwargs)}.",
+                              stacklevel=2)
 
+        self.hw = hw
         self.unit = unit
-        self.keys = ['pressure', 'temperature', 'volumetric_flow', 'mass_flow',
-                     'setpoint', 'gas']
+        self.keys = self._keys_by_length[6]
         self.open = True
         self.firmware: str | None = None
+        # Created on first use, as there may be no running event loop yet
+        self._firmware_lock: asyncio.Lock | None = None
+        # Register last, so a failed construction never holds a reference
+        self._pool_key: tuple[str, asyncio.AbstractEventLoop] | None = None
+        if loop is not None:
+            self._pool_key = (address, loop)
+            self.open_ports[self._pool_key] = (hw, refcount + 1)
 
     async def __aenter__(self, *args: Any) -> FlowMeter:
         """Provide async enter to context manager."""
@@ -69,8 +112,7 @@ class FlowMeter:
         """
         is_device = False
         try:
-            device = cls(port, unit)
-            try:
+            async with cls(port, unit) as device:
                 c = await device.get()
                 if cls.__name__ == 'FlowMeter':
                     assert c
@@ -81,12 +123,24 @@ class FlowMeter:
                 else:
                     raise NotImplementedError('Must be meter or controller.')
                 is_device = True
-            finally:
-                await device.close()
         except Exception:
             pass
         return is_device
 
+    @classmethod
+    async def find_ports(cls, ports: Iterable[str], unit: str = 'A') -> list[str]:
+        """Return the ports that are connected to this device.
+
+        This runs `is_connected` on all ports at once and returns matches in
+        the order given. This is the recommended way to discover connected
+        Alicats. With the `fast` extra installed, scanning many serial ports
+        takes about as long as scanning one. Without it, blocking serial
+        reads mean the ports are still probed one after another.
+        """
+        ports = list(ports)
+        connected = await asyncio.gather(*(cls.is_connected(port, unit) for port in ports))
+        return [port for port, is_device in zip(ports, connected) if is_device]
+
     def _test_controller_open(self) -> None:
         """Raise an IOError if the FlowMeter has been closed.
 
@@ -120,32 +174,27 @@ class FlowMeter:
             The state of the flow controller, as a dictionary.
 
         """
-        command = f'{self.unit}'
-        line = await self._write_and_read(command)
+        unit_id = self.unit
+        line = await self._write_and_read(unit_id)
         if not line:
             raise OSError("Could not read values")
-        spl = line.split()
-        unit, values = spl[0], spl[1:]
+        unit, _, rest = line.partition(' ')
+        values = rest.split()
 
         # Over range errors for mass, volume, pressure, and temperature
         # Explicitly silenced because I find it redundant.
-        while values[-1].upper() in ['MOV', 'VOV', 'POV', 'TOV']:
-            del values[-1]
-        if unit != self.unit:
+        while values and values[-1].upper() in _OVER_RANGE_FLAGS:
+            values.pop()
+        if unit != unit_id:
             raise ValueError("Flow controller unit ID mismatch.")
         if values[-1].upper() == 'LCK':
             self.button_lock = True
             del values[-1]
         else:
             self.button_lock = False
-        if len(values) == 5 and len(self.keys) == 6:
-            del self.keys[-2]
-        elif len(values) == 7 and len(self.keys) == 6:
-            self.keys.insert(5, 'total flow')
-        elif len(values) == 2 and len(self.keys) == 6:
-            self.keys.insert(1, 'setpoint')
-        return {k: (float(v) if _is_float(v) else v)
-                for k, v in zip(self.keys, values)}
+        keys = self._keys_by_length.get(len(values), self._keys_by_length[6])
+        self.keys = keys
+        return {k: _try_float(v) for k, v in zip(keys, values)}
 
     async def set_gas(self, gas: str | int) -> None:
         """Set the gas type.
@@ -160,9 +209,9 @@ class FlowMeter:
                 Gas mixes may only be called by their mix number.
         """
         if isinstance(gas, str):
-            if gas not in self.gases:
+            gas_number = self._gas_index.get(gas)
+            if gas_number is None:
                 raise ValueError(f"{gas} not supported!")
-            gas_number = self.gases.index(gas)
         else:
             gas_number = gas
         command = f'{self.unit}$$W46={gas_number}'
@@ -199,10 +248,11 @@ class FlowMeter:
         if total_percent != 100:
             raise ValueError("Percentages of gas mix must add to 100%!")
 
-        if any(gas not in self.gases for gas in gases):
+        gas_index = self._gas_index
+        if any(gas not in gas_index for gas in gases):
             raise ValueError("Gas not supported!")
 
-        gas_list = [f'{percent} {self.gases.index(gas)}' for gas, percent in gases.items()]
+        gas_list = [f'{percent} {gas_index[gas]}' for gas, percent in gases.items()]
         command = ' '.join([
             self.unit,
             'GM',
@@ -263,12 +313,19 @@ class FlowMeter:
 
     async def get_firmware(self) -> str:
         """Get the device firmware version."""
-        if self.firmware is None:
-            command = f'{self.unit}VE'
-            self.firmware = await self._write_and_read(command)
-        if not self.firmware:
+        firmware = self.firmware
+        if firmware:
+            return firmware
+        if self._firmware_lock is None:
+            self._firmware_lock = asyncio.Lock()
+        async with self._firmware_lock:
+            firmware = self.firmware
+            if not firmware:
+                command = f'{self.unit}VE'
+                firmware = self.firmware = await self._write_and_read(command)
+        if not firmware:
             raise OSError("Unable to get firmware.")
-        return self.firmware
+        return firmware
 
     async def flush(self) -> None:
         """Read all available information. Use to clear queue."""
@@ -283,7 +340,14 @@ class FlowMeter:
         """
         if not self.open:
             return
-        await self.hw.close()
+        refcount = 1
+        key = self._pool_key
+        if key is not None and key in self.open_ports:
+            refcount = self.open_ports.pop(key)[1]
+            if refcount > 1:
+                self.open_ports[key] = (self.hw, refcount - 1)
+        if refcount <= 1:
+            await self.hw.close()
         self.open = False
 
 
@@ -300,9 +364,15 @@ class FlowController(FlowMeter):
     that the "Input" option is set to "Serial".
     """
 
+    __slots__ = ('_init_task', 'control_point', 'pid_keys')
+
     registers: ClassVar[dict] = {'mass flow': 0b00100101, 'vol flow': 0b00100100,
                                  'abs pressure': 0b00100010, 'gauge pressure': 0b00100110,
                                  'diff pressure': 0b00100111}
+    _control_points: ClassVar[dict[int, str]] = {r: p for p, r in registers.items()}
+    # PID loop types, indexed by register 85 value, and the reverse mapping
+    _loop_types: ClassVar[tuple[str, ...]] = ('PD/PDF', 'PD/PDF', 'PD2I')
+    _loop_numbers: ClassVar[dict[str, int]] = {'PD/PDF': 1, 'PD2I': 2}
 
     def __init__(self, address: str='/dev/ttyUSB0', unit: str='A', **kwargs: Any) -> None:
         """Connect this driver with the appropriate USB / serial port.
@@ -311,11 +381,16 @@ class FlowController(FlowMeter):
             address: The serial port or TCP address:port. Default '/dev/ttyUSB0'.
             unit: The Alicat-specified unit ID, A-Z. Default 'A'.
         """
-        FlowMeter.__init__(self, address, unit, **kwargs)
         self.control_point = None
         async def _init_control_point() -> None:
             self.control_point = await self._get_control_point()
-        self._init_task = asyncio.create_task(_init_control_point())
+        # Scheduled first, so a missing event loop fails before the port is opened
+        self._init_task = asyncio.get_running_loop().create_task(_init_control_point())
+        try:
+            super().__init__(address, unit, **kwargs)
+        except Exception:
+            self._init_task.cancel()
+            raise
 
     async def __aenter__(self, *args: Any) -> FlowController:
         """Provide async enter to context manager."""
@@ -444,7 +519,7 @@ class FlowController(FlowMeter):
         spl = read_loop_type.split()
 
         loopnum = int(spl[3])
-        loop_type = ['PD/PDF', 'PD/PDF', 'PD2I'][loopnum]
+        loop_type = self._loop_types[loopnum]
         pid_values = [loop_type]
         for register in range(21, 24):
             value = await self._write_and_read(f'{self.unit}$$r{register}')
@@ -471,10 +546,9 @@ class FlowController(FlowMeter):
         This communication works by writing Alicat registers directly.
         """
         if loop_type is not None:
-            options = ['PD/PDF', 'PD2I']
-            if loop_type not in options:
-                raise ValueError(f'Loop type must be {options[0]} or {options[1]}.')
-            loop_num=options.index(loop_type) + 1
+            loop_num = self._loop_numbers.get(loop_type)
+            if loop_num is None:
+                raise ValueError('Loop type must be PD/PDF or PD2I.')
             command = f'{self.unit}$$w85={loop_num}'
             await self._write_and_read(command)
         if p is not None:
@@ -498,7 +572,7 @@ class FlowController(FlowMeter):
         if not line:
             raise OSError("Could not set setpoint.")
         try:
-            current = float(line.split()[5])
+            current = float(line.split(None, 6)[5])
         except IndexError:
             current = None
         if current is not None and abs(current - setpoint) > 0.01:
@@ -510,13 +584,12 @@ class FlowController(FlowMeter):
         line = await self._write_and_read(command)
         if not line:
             raise OSError("Could not read control point.")
-        value = int(line.split('=')[-1])
-        try:
-            cp = next(p for p, r in self.registers.items() if value == r)
-            self.control_point = cp
-            return cp
-        except StopIteration:
-            raise ValueError(f"Unexpected register value: {value:d}") from None
+        value = int(line.rpartition('=')[2])
+        cp = self._control_points.get(value)
+        if cp is None:
+            raise ValueError(f"Unexpected register value: {value:d}")
+        self.control_point = cp
+        return cp
 
     async def _set_control_point(self, point: str) -> None:
         """Set whether to control on mass flow or pressure.
@@ -531,7 +604,7 @@ class FlowController(FlowMeter):
         line = await self._write_and_read(command)
         if not line:
             raise OSError("Could not set control point.")
-        value = int(line.split('=')[-1])
+        value = int(line.rpartition('=')[2])
         if value != reg:
             raise OSError("Could not set control point.")
         self.control_point = point
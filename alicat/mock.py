@@ -1,27 +1,43 @@
 """Mock for offline testing of `FlowController`s."""
 
+import asyncio
 from random import choice, random
-from time import sleep
-from typing import Any, Dict, Union
-from unittest.mock import MagicMock
+from typing import Any, Dict, Optional, Union
 
 from .driver import FlowController as RealFlowController
 
 
-class AsyncClientMock(MagicMock):
-    """Magic mock that works with async methods."""
+class AsyncClientMock:
+    """Lightweight stand-in for `alicat.util.Client` that never touches hardware."""
 
-    async def __call__(self, *args, **kwargs):  # type: ignore [no-untyped-def]
-        """Convert regular mocks into into an async coroutine."""
-        return super().__call__(*args, **kwargs)
+    __slots__ = ()
+
+    address = ''
+
+    async def _write_and_read(self, command: str) -> Optional[str]:
+        """Accept a command without a response."""
+        return None
+
+    async def _clear(self) -> None:
+        """Clear the (empty) reader stream."""
+        pass
+
+    async def close(self) -> None:
+        """Close the (nonexistent) connection."""
+        pass
 
 
 class FlowController(RealFlowController):
     """Mocks an Alicat MFC for offline testing."""
 
+    # Identical for every mock, so shared rather than set per instance
+    keys = ('pressure', 'temperature', 'volumetric_flow', 'mass_flow', 'setpoint', 'gas')
+    firmware = '6v21.0-R22 Nov 30 2016,16:04:20'
+
     def __init__(self, address: str, unit: str = 'A', *args: Any, **kwargs: Any) -> None:
         """Initialize the device client."""
-        self.hw = AsyncClientMock()
+        self.hw = AsyncClientMock()  # type: ignore [assignment]
+        self._pool_key = None
         self.open = True
         self.control_point: str = choice(['flow', 'pressure'])
         self.state: Dict[str, Union[str, float]] = {
@@ -36,13 +52,10 @@ class FlowController(RealFlowController):
         }
         self.unit: str = unit
         self.button_lock: bool = False
-        self.keys = ['pressure', 'temperature', 'volumetric_flow', 'mass_flow',
-                     'setpoint', 'gas']
-        self.firmware = '6v21.0-R22 Nov 30 2016,16:04:20'
 
     async def get(self) -> Dict[str, Union[str, float]]:
         """Return the full state."""
-        sleep(random() * 0.25)
+        await asyncio.sleep(random() * 0.25)
         return self.state
 
     async def _set_setpoint(self, setpoint: float) -> None:
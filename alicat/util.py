@@ -10,6 +10,11 @@ from typing import Any, Dict, Optional, Union
 
 import serial
 
+try:
+    import serial_asyncio_fast  # type: ignore[import-not-found]
+except ImportError:
+    serial_asyncio_fast = None  # type: ignore[assignment]
+
 logger = logging.getLogger('alicat')
 
 
@@ -49,8 +54,9 @@ class Client(ABC):
         As industrial devices are commonly unplugged, this has been expanded to
         handle recovering from disconnects.
         """
-        await self._handle_connection()
         async with self.lock:
+            # Connect under the lock, so concurrent first requests open the port only once
+            await self._handle_connection()
             if self.open:
                 try:
                     response = await self._handle_communication(command)
@@ -67,7 +73,7 @@ class Client(ABC):
         try:
             junk = await asyncio.wait_for(self._read(100), timeout=0.5)
             logger.warning(junk)
-        except TimeoutError:
+        except asyncio.TimeoutError:
             pass
 
     async def _handle_communication(self, command: str) -> Optional[str]:
@@ -186,7 +192,12 @@ class TcpClient(Client):
 
 
 class SerialClient(Client):
-    """Client using a directly-connected RS232 serial device."""
+    """Client using a directly-connected RS232 serial device.
+
+    If `pyserial-asyncio-fast` is installed (`pip install alicat[fast]`), the
+    port is driven through non-blocking asyncio streams. Otherwise, this falls
+    back to blocking pyserial calls.
+    """
 
     def __init__(self, address: str, baudrate: int=19200, timeout: float=.15,
                  bytesize: int = serial.EIGHTBITS,
@@ -201,30 +212,68 @@ class SerialClient(Client):
                                'stopbits': stopbits,
                                'parity': parity,
                                'timeout': timeout}
-        self.ser = serial.Serial(self.address, **self.serial_details)  # type: ignore [arg-type]
+        if serial_asyncio_fast is None:
+            self.ser = serial.Serial(self.address, **self.serial_details)  # type: ignore [arg-type]
+
+    async def _connect(self) -> None:
+        """Asynchronously open the serial port as a pair of streams."""
+        reader, writer = await serial_asyncio_fast.open_serial_connection(
+            url=self.address, **self.serial_details)  # type: ignore [arg-type]
+        self.connection = {'reader': reader, 'writer': writer}
+        self.open = True
 
     async def _read(self, length: int) -> str:
         """Read a fixed number of bytes from the device."""
-        return self.ser.read(length).decode()
+        await self._handle_connection()
+        if serial_asyncio_fast is None:
+            return self.ser.read(length).decode()
+        response = await self.connection['reader'].read(length)
+        return response.decode()
 
     async def _readline(self) -> str:
         """Read until a LF terminator."""
-        return self.ser.readline().strip().decode().replace('\x00', '')
+        await self._handle_connection()
+        if serial_asyncio_fast is None:
+            return self.ser.readline().strip().decode().replace('\x00', '')
+        response = await asyncio.wait_for(
+            self.connection['reader'].readuntil(self.eol), timeout=self.timeout)
+        return response.strip().decode().replace('\x00', '')
 
     async def _write(self, message: str) -> None:
         """Write a message to the device."""
-        self.ser.write(message.encode() + self.eol)
+        await self._handle_connection()
+        if serial_asyncio_fast is None:
+            self.ser.write(message.encode() + self.eol)
+        else:
+            self.connection['writer'].write(message.encode() + self.eol)
 
     async def close(self) -> None:
         """Release resources."""
-        self.ser.close()
+        if serial_asyncio_fast is None:
+            self.ser.close()
+        elif self.open:
+            writer = self.connection['writer']
+            writer.close()
+            await writer.wait_closed()
+        self.open = False
 
     async def _handle_connection(self) -> None:
-        self.open = True
+        """Automatically maintain the serial connection."""
+        if self.open:
+            return
+        if serial_asyncio_fast is None:
+            self.open = True
+            return
+        try:
+            await self._connect()
+            self.reconnecting = False
+        except OSError:
+            if not self.reconnecting:
+                logger.error(f'Connecting to {self.address} failed.')
+            self.reconnecting = True
 
-def _is_float(msg: Any) -> bool:
+def _try_float(msg: str) -> Union[float, str]:
     try:
-        float(msg)
-        return True
+        return float(msg)
     except ValueError:
-        return False
+        return msg
@@ -19,11 +19,14 @@ setup(
     package_data={"alicat": ["py.typed"]},
     install_requires=["pyserial"],
     extras_require={
+            'fast': ['pyserial-asyncio-fast'],
+            'fastloop': ['uvloop>=0.18; sys_platform != "win32"'],
             'test': [
                 'pytest>=8,<9',
                 'pytest-cov>=5,<6',
                 'pytest-asyncio>=0.23.5',
                 'pytest-xdist==3.*',
+                'pyserial-asyncio-fast',
                 'ruff==0.3.0',
                 'mypy==1.9.0',
                 'types-pyserial',
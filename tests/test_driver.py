@@ -1,4 +1,7 @@
 """Test the driver responds with correct data."""
+import asyncio
+import os
+import threading
 from random import uniform
 from unittest import mock
 
@@ -7,9 +10,79 @@ import pytest
 from alicat import command_line
 
 # from alicat.driver import FlowController
+from alicat.driver import FlowController as RealFlowController
+from alicat.driver import FlowMeter
 from alicat.mock import FlowController
+from alicat.util import SerialClient
 
 ADDRESS = '/dev/tty.usbserial-FTCJ5EK9'
+METER_FRAME = 'A +014.70 +025.00 +000.00 +000.00 N2'
+CONTROLLER_FRAME = 'A +014.70 +025.00 +000.00 +000.00 +010.00 N2'
+
+
+def _reply(command):
+    """Answer a command like a mass flow controller on the addressed unit."""
+    unit = command[0]
+    if command.endswith('R122'):
+        return f'{unit}   122 = 37'
+    if command.endswith('VE'):
+        return f'{unit}   6v21.0-R22 Nov 30 2016,16:04:20'
+    return f'{unit} +014.70 +025.00 +000.00 +000.00 +000.00 N2'
+
+
+def _serve_frames(device, *frames):
+    """Have `device` read the given responses, in order, and return the commands it sends."""
+    replies = iter(frames)
+    commands = []
+
+    async def write_and_read(command):
+        commands.append(command)
+        await asyncio.sleep(0)  # yield, as a real round trip would
+        return next(replies)
+
+    device.hw._write_and_read = write_and_read
+    return commands
+
+
+@pytest.fixture()
+def serial_ports():
+    """Yield a factory for pseudo-terminal ports that serve `_reply` or stay silent."""
+    pytest.importorskip('serial_asyncio_fast')
+    pty = pytest.importorskip('pty')
+    opened = []
+
+    def serve(device):
+        buffer = b''
+        while True:
+            try:
+                buffer += os.read(device, 64)
+            except OSError:  # the port side of the pty has been closed
+                return
+            while b'\r' in buffer:
+                command, _, buffer = buffer.partition(b'\r')
+                os.write(device, _reply(command.decode()).encode() + b'\r')
+
+    def open_port(answer=True):
+        device, port = pty.openpty()
+        thread = None
+        if answer:
+            thread = threading.Thread(target=serve, args=(device,), daemon=True)
+            thread.start()
+        opened.append((device, port, thread))
+        return os.ttyname(port)
+
+    yield open_port
+    for device, port, thread in opened:
+        os.close(port)
+        if thread is not None:
+            thread.join(timeout=1)
+        os.close(device)
+
+
+@pytest.fixture()
+def serial_port(serial_ports):
+    """Yield the name of a pseudo-terminal port that serves `_reply`."""
+    return serial_ports()
 
 
 @pytest.mark.parametrize('unit', ['A', 'B'])
@@ -63,3 +136,176 @@ async def test_get_firmware():
     async with FlowController(ADDRESS) as device:
         result = await device.get_firmware()
         assert 'v' in result or 'GP' in result
+
+
+async def test_find_ports():
+    """Confirm that port discovery reports connected devices."""
+    assert await FlowController.find_ports([ADDRESS]) == [ADDRESS]
+
+
+async def test_find_ports_skips_silent(serial_ports):
+    """Confirm that silent ports are dropped and the rest keep their order."""
+    ports = [serial_ports(), serial_ports(answer=False), serial_ports()]
+    assert await RealFlowController.find_ports(ports) == [ports[0], ports[2]]
+    assert await RealFlowController.find_ports(ports[::-1]) == [ports[2], ports[0]]
+
+
+async def test_shared_port():
+    """Confirm that devices on the same port share one connection."""
+    device_a = FlowMeter('localhost:4001', unit='A')
+    device_b = FlowMeter('localhost:4001', unit='B')
+    assert device_a.hw is device_b.hw
+    key = ('localhost:4001', asyncio.get_running_loop())
+    assert FlowMeter.open_ports[key] == (device_a.hw, 2)
+    await device_a.close()
+    assert FlowMeter.open_ports[key] == (device_b.hw, 1)
+    await device_b.close()
+    assert key not in FlowMeter.open_ports
+
+
+async def test_shared_port_ignored_kwargs():
+    """Confirm that connection kwargs for an already open port warn."""
+    async with FlowMeter('localhost:4001', timeout=1.0) as device_a:
+        with pytest.warns(UserWarning, match='ignoring timeout'):
+            device_b = FlowMeter('localhost:4001', timeout=2.0)
+        assert device_b.hw is device_a.hw
+        await device_b.close()
+
+
+def test_failed_construction_not_pooled():
+    """Confirm that a controller that fails to construct holds no connection."""
+    with pytest.raises(RuntimeError):
+        RealFlowController('localhost:5000')  # no running event loop
+    assert not any(port == 'localhost:5000' for port, _ in FlowMeter.open_ports)
+
+
+async def test_failed_construction_in_loop_not_pooled():
+    """Confirm that a bad address leaves no pool entry or pending task behind."""
+    with pytest.raises(ValueError, match='hostname:port'):
+        RealFlowController('localhost')
+    assert not any(port == 'localhost' for port, _ in FlowMeter.open_ports)
+
+
+async def test_concurrent_first_requests(serial_port):
+    """Confirm that concurrent requests on a fresh port open it only once."""
+    client = SerialClient(serial_port)
+    try:
+        replies = await asyncio.gather(client._write_and_read('A'),
+                                       client._write_and_read('B'),
+                                       client._write_and_read('AVE'))
+    finally:
+        await client.close()
+    assert replies == [_reply('A'), _reply('B'), _reply('AVE')]
+
+
+async def test_shared_port_io(serial_port):
+    """Confirm that controllers sharing a port each read their own data."""
+    async with RealFlowController(serial_port, unit='A') as device_a, \
+               RealFlowController(serial_port, unit='B') as device_b:
+        assert device_a.hw is device_b.hw
+        state_a, state_b = await asyncio.gather(device_a.get(), device_b.get())
+    for state in (state_a, state_b):
+        assert state['pressure'] == 14.7
+        assert state['gas'] == 'N2'
+        assert state['control_point'] == 'mass flow'
+    assert not any(port == serial_port for port, _ in FlowMeter.open_ports)
+
+
+@pytest.mark.filterwarnings('ignore:loop is closed:ResourceWarning')
+def test_shared_port_new_event_loop(serial_port):
+    """Confirm that a device left open does not leak into a later event loop."""
+    leaked = []
+
+    async def poll(close):
+        device = FlowMeter(serial_port)
+        state = await device.get()
+        if close:
+            await device.close()
+        else:
+            leaked.append(device)
+        return state
+
+    for close in (False, True):
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(poll(close))['gas'] == 'N2'
+        finally:
+            loop.close()
+    assert not any(port == serial_port for port, _ in FlowMeter.open_ports)
+    # The first loop is gone, so release its port directly
+    leaked[0].hw.connection['writer'].transport.serial.close()
+
+
+@pytest.mark.parametrize('flags', ['MOV', 'Mov', 'vov', 'POV TOV'])
+async def test_over_range_flags(flags):
+    """Confirm that over range flags are stripped regardless of case."""
+    async with FlowMeter('localhost:4002') as device:
+        _serve_frames(device, f'A +014.70 +025.00 +000.00 +000.00 +000.00 N2 {flags}')
+        state = await device.get()
+    assert state == {'pressure': 14.7, 'temperature': 25.0, 'volumetric_flow': 0.0,
+                     'mass_flow': 0.0, 'setpoint': 0.0, 'gas': 'N2'}
+
+
+@pytest.mark.parametrize(('frame', 'expected'), [
+    ('A +014.70 +010.00', {'pressure': 14.7, 'setpoint': 10.0}),
+    (METER_FRAME, {'pressure': 14.7, 'temperature': 25.0, 'volumetric_flow': 0.0,
+                   'mass_flow': 0.0, 'gas': 'N2'}),
+    (CONTROLLER_FRAME, {'pressure': 14.7, 'temperature': 25.0, 'volumetric_flow': 0.0,
+                        'mass_flow': 0.0, 'setpoint': 10.0, 'gas': 'N2'}),
+    ('A +014.70 +025.00 +000.00 +000.00 +010.00 +001.50 N2',
+     {'pressure': 14.7, 'temperature': 25.0, 'volumetric_flow': 0.0, 'mass_flow': 0.0,
+      'setpoint': 10.0, 'total flow': 1.5, 'gas': 'N2'}),
+])
+async def test_parse_frame(frame, expected):
+    """Confirm that data frames of each length map onto the right keys."""
+    async with FlowMeter('localhost:4003') as device:
+        _serve_frames(device, frame)
+        assert await device.get() == expected
+        assert device.keys == tuple(expected)
+        assert not device.button_lock
+
+
+async def test_parse_locked_frame():
+    """Confirm that the button lock flag is read and stripped."""
+    async with FlowMeter('localhost:4003') as device:
+        _serve_frames(device, f'{CONTROLLER_FRAME} LCK', CONTROLLER_FRAME)
+        assert 'LCK' not in (await device.get()).values()
+        assert device.button_lock
+        await device.get()
+        assert not device.button_lock
+
+
+async def test_keys_follow_frame_length():
+    """Confirm that the keys track the device if its frame length changes."""
+    async with FlowMeter('localhost:4003') as device:
+        _serve_frames(device, METER_FRAME, CONTROLLER_FRAME, METER_FRAME)
+        assert 'setpoint' not in await device.get()
+        assert 'setpoint' not in device.keys
+        assert (await device.get())['setpoint'] == 10.0
+        assert 'setpoint' in device.keys
+        assert (await device.get())['gas'] == 'N2'
+        assert 'setpoint' not in device.keys
+
+
+async def test_unit_mismatch():
+    """Confirm that a frame from another unit is rejected."""
+    async with FlowMeter('localhost:4003', unit='B') as device:
+        _serve_frames(device, CONTROLLER_FRAME)
+        with pytest.raises(ValueError, match='unit ID mismatch'):
+            await device.get()
+
+
+async def test_flush_fresh_port(serial_port):
+    """Confirm that flushing a fresh serial port connects it first."""
+    async with FlowMeter(serial_port) as device:
+        await device.flush()
+        assert device.hw.open
+
+
+async def test_concurrent_firmware_reads():
+    """Confirm that concurrent firmware reads share a single request."""
+    async with FlowMeter('localhost:4004') as device:
+        commands = _serve_frames(device, 'A   6v21.0-R22 Nov 30 2016,16:04:20')
+        firmware = await asyncio.gather(device.get_firmware(), device.get_firmware())
+    assert firmware == ['A   6v21.0-R22 Nov 30 2016,16:04:20'] * 2
+    assert commands == ['AVE']